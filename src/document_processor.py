@@ -1,31 +1,44 @@
-from PyPDF2 import PdfReader
+import pypdfium2 as pdfium
 from docx import Document
 import os
-import warnings
 import logging
+from typing import Optional
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def file_extension(path: str) -> str:
+    """Return the lowercased extension of a path, matching os.path.splitext."""
+    dot = path.rfind('.')
+    sep = path.rfind(os.sep)
+    if os.altsep:
+        sep = max(sep, path.rfind(os.altsep))
+    # No dot in the file name, or only leading dots (e.g. ".docx")
+    if dot <= sep or not path[sep + 1:dot].lstrip('.'):
+        return ''
+    return path[dot:].lower()
+
 class DocumentProcessor:
     def __init__(self):
-        self.supported_extensions = {'.pdf', '.docx'}
-        # Suppress PyPDF2 warnings about float objects
-        warnings.filterwarnings('ignore', category=UserWarning, module='PyPDF2')
+        # Map each supported extension to its extraction method
+        self._extractors = {
+            '.pdf': self._extract_from_pdf,
+            '.docx': self._extract_from_docx
+        }
+        self.supported_extensions = set(self._extractors)
 
-    def extract_text(self, file_path: str) -> str:
-        """Extract text from PDF or DOCX files."""
-        extension = os.path.splitext(file_path)[1].lower()
+    def extract_text(self, file_path: str, extension: Optional[str] = None) -> str:
+        """Extract text from PDF or DOCX files. Pass the lowercased extension if already known."""
+        if extension is None:
+            extension = file_extension(file_path)
         
-        if extension not in self.supported_extensions:
+        extractor = self._extractors.get(extension)
+        if extractor is None:
             raise ValueError(f"Unsupported file type: {extension}")
         
         try:
-            if extension == '.pdf':
-                return self._extract_from_pdf(file_path)
-            elif extension == '.docx':
-                return self._extract_from_docx(file_path)
+            return extractor(file_path)
         except Exception as e:
             logger.error(f"Error extracting text from {file_path}: {str(e)}")
             return ""  # Return empty string on error instead of failing
@@ -34,19 +47,31 @@ class DocumentProcessor:
         """Extract text from PDF file."""
         text = []
         try:
-            with open(file_path, 'rb') as f:
-                reader = PdfReader(f)
-                for page_num, page in enumerate(reader.pages):
-                    try:
-                        extracted_text = page.extract_text()
-                        if extracted_text:
-                            text.append(extracted_text)
-                    except Exception as e:
-                        logger.warning(f"Error extracting text from page {page_num} in {file_path}: {str(e)}")
-                        continue
+            pdf = pdfium.PdfDocument(file_path)
         except Exception as e:
             logger.error(f"Error reading PDF file {file_path}: {str(e)}")
             return ""
+
+        try:
+            for page_num in range(len(pdf)):
+                page = textpage = None
+                try:
+                    page = pdf[page_num]
+                    textpage = page.get_textpage()
+                    # PDFium separates lines with CRLF
+                    extracted_text = textpage.get_text_bounded().replace('\r\n', '\n')
+                    if extracted_text:
+                        text.append(extracted_text)
+                except Exception as e:
+                    logger.warning(f"Error extracting text from page {page_num} in {file_path}: {str(e)}")
+                    continue
+                finally:
+                    if textpage is not None:
+                        textpage.close()
+                    if page is not None:
+                        page.close()
+        finally:
+            pdf.close()
             
         return "\n".join(text) if text else ""
 
@@ -54,8 +79,7 @@ class DocumentProcessor:
         """Extract text from DOCX file."""
         try:
             doc = Document(file_path)
-            full_text = [p.text for p in doc.paragraphs if p.text.strip()]
-            return "\n".join(full_text)
+            return "\n".join(p.text for p in doc.paragraphs if p.text.strip())
         except Exception as e:
             logger.error(f"Error reading DOCX file {file_path}: {str(e)}")
             return "" 
\ No newline at end of file
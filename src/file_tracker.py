@@ -1,6 +1,6 @@
-import json
+import orjson
 import os
-from typing import Dict
+from typing import Dict, Optional
 from datetime import datetime
 import logging
 
@@ -8,12 +8,15 @@ class FileTracker:
     def __init__(self, tracker_file: str = "file_tracker.json"):
         self.tracker_file = tracker_file
         self.tracked_files: Dict[str, float] = self._load_tracker()
+        self.dirty = False
+        # mtimes seen by needs_update, reused when the file is marked processed
+        self._mtime_cache: Dict[str, float] = {}
 
     def _load_tracker(self) -> Dict[str, float]:
         """Load the tracker file if it exists."""
         if os.path.exists(self.tracker_file):
-            with open(self.tracker_file, 'r') as f:
-                data = json.load(f)
+            with open(self.tracker_file, 'rb') as f:
+                data = orjson.loads(f.read())
                 logging.info(f"Loaded {len(data)} entries from tracker file")
                 return data
         logging.info("No existing tracker file found, starting fresh")
@@ -21,15 +24,27 @@ class FileTracker:
 
     def _save_tracker(self):
         """Save the current state of tracked files."""
-        with open(self.tracker_file, 'w') as f:
-            json.dump(self.tracked_files, f, indent=2)
+        tmp_file = f"{self.tracker_file}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(orjson.dumps(self.tracked_files, option=orjson.OPT_INDENT_2))
+        os.replace(tmp_file, self.tracker_file)
+        self.dirty = False
 
-    def needs_update(self, file_path: str) -> bool:
-        """Check if a file needs to be processed."""
-        if not os.path.exists(file_path):
-            return False
+    def flush(self):
+        """Write pending changes to the tracker file."""
+        if self.dirty:
+            self._save_tracker()
+
+    def needs_update(self, file_path: str, mtime: Optional[float] = None) -> bool:
+        """Check if a file needs to be processed. Pass mtime if it is already known."""
+        if mtime is not None:
+            current_mtime = mtime
+        else:
+            try:
+                current_mtime = os.stat(file_path).st_mtime
+            except FileNotFoundError:
+                return False
 
-        current_mtime = os.path.getmtime(file_path)
         last_processed = self.tracked_files.get(file_path, 0)
         
         # Add debug logging
@@ -37,15 +52,21 @@ class FileTracker:
         logging.debug(f"Current mtime: {current_mtime}")
         logging.debug(f"Last processed: {last_processed}")
         
-        return current_mtime > last_processed
+        if current_mtime > last_processed:
+            self._mtime_cache[file_path] = current_mtime
+            return True
+        return False
 
     def update_file_timestamp(self, file_path: str):
         """Update the last processed timestamp for a file."""
-        self.tracked_files[file_path] = os.path.getmtime(file_path)
-        self._save_tracker()
+        mtime = self._mtime_cache.pop(file_path, None)
+        if mtime is None:
+            mtime = os.path.getmtime(file_path)
+        self.tracked_files[file_path] = mtime
+        self.dirty = True
 
     def remove_file(self, file_path: str):
         """Remove a file from tracking."""
         if file_path in self.tracked_files:
             del self.tracked_files[file_path]
-            self._save_tracker() 
\ No newline at end of file
+            self.dirty = True
@@ -1,13 +1,53 @@
 import os
+import re
 import yaml
-from typing import Set
+from typing import FrozenSet, Iterator, List, Optional, Set, Tuple
 from datetime import datetime
-from document_processor import DocumentProcessor
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from enum import Enum
+from document_processor import DocumentProcessor, file_extension
 from xml_handler import XMLHandler
 from file_tracker import FileTracker
 import logging
+import multiprocessing
+import queue
+import threading
 from pathlib import Path
 
+# Upper bound on extraction worker processes
+MAX_WORKERS = 8
+
+# Extracted documents waiting to be written to XML; bounds memory use on large runs
+RESULT_QUEUE_SIZE = 32
+
+class FileKind(Enum):
+    DOCUMENT = "document"
+    IGNORED = "ignored"
+    UNSUPPORTED = "unsupported"
+
+def _classify_ext(extension: str, documents: FrozenSet[str], ignored: FrozenSet[str]) -> FileKind:
+    """Classify a lowercased file extension against the configured extension sets."""
+    if extension in ignored:
+        return FileKind.IGNORED
+    if extension in documents:
+        return FileKind.DOCUMENT
+    return FileKind.UNSUPPORTED
+
+_worker_processor = None
+
+def extract_one(file_path: str, extension: Optional[str] = None) -> Tuple[str, str]:
+    """Extract text from a single file. Runs inside a worker process."""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+    try:
+        return file_path, _worker_processor.extract_text(file_path, extension)
+    except Exception as e:
+        logging.error(f"Error extracting text from {file_path}: {str(e)}")
+        return file_path, ""
+
 class DocumentProcessingPipeline:
     def __init__(self, config_path: str = "config.yaml"):
         # Set up logging
@@ -26,12 +66,18 @@ class DocumentProcessingPipeline:
             raise
 
         # Initialize components
-        self.doc_processor = DocumentProcessor()
         self.xml_handler = XMLHandler(self.config['paths']['output_folder'], self.config)
         self.file_tracker = FileTracker()
         
-        self.document_extensions = set(self.config['file_types']['documents'])
-        self.ignore_extensions = set(self.config['file_types']['ignore'])
+        self.document_extensions = frozenset(self.config['file_types']['documents'])
+        self.ignore_extensions = frozenset(self.config['file_types']['ignore'])
+        
+        # Single pattern matching any category folder name, one named group per category
+        folders = self.config['folders']
+        self._category_pattern = re.compile('|'.join(
+            f"(?P<{category}>{re.escape(folders[category].lower())})"
+            for category in ('external', 'internal', 'client')
+        ))
         
         self.logger.info("Pipeline initialized successfully")
 
@@ -44,59 +90,162 @@ class DocumentProcessingPipeline:
         files_skipped = 0
         files_errored = 0
         
-        for subdir, _, files in os.walk(root_path):
-            for filename in files:
-                file_path = os.path.join(subdir, filename)
+        # Collect files that need extraction along with their category
+        pending = []
+        for subdir, files in self._walk(root_path):
+            # Category depends only on the directory, so resolve it once for all its files
+            category = self._determine_category(subdir)
+            for entry in files:
+                # Reject ignored and unsupported extensions before any filesystem work
+                extension = file_extension(entry.name)
+                kind = _classify_ext(extension, self.document_extensions, self.ignore_extensions)
+                if kind is not FileKind.DOCUMENT:
+                    self.logger.debug(f"Skipped {entry.path}: {kind.value} extension {extension}")
+                    files_skipped += 1
+                    continue
+
+                file_path = entry.path
                 try:
-                    result = self._process_file(file_path, subdir)
-                    if result == "processed":
-                        files_processed += 1
-                    elif result == "skipped":
-                        files_skipped += 1
+                    if self._select_file(entry, subdir, category):
+                        pending.append((file_path, category, extension))
                     else:
-                        files_errored += 1
+                        files_skipped += 1
                 except Exception as e:
                     self.logger.error(f"Error processing {file_path}: {str(e)}")
                     files_errored += 1
-        
-        # Save all XML files
-        self.xml_handler.save_all()
+
+        try:
+            # Extract text in parallel; XML and tracker updates stay on this process
+            if pending:
+                processed, errored = self._extract_all(pending)
+                files_processed += processed
+                files_errored += errored
+        finally:
+            # Save all XML files, keeping whatever was extracted. The tracker is only
+            # written once the XML is on disk, otherwise unsaved files would be skipped next run
+            if self.xml_handler.save_all():
+                self.file_tracker.flush()
+            else:
+                self.logger.error("Not all XML files were saved, leaving the tracker file unchanged")
         
         self.logger.info(f"Processing complete. "
                         f"Processed: {files_processed}, "
                         f"Skipped: {files_skipped}, "
                         f"Errors: {files_errored}")
 
-    def _process_file(self, file_path: str, subdir: str) -> str:
-        """Process individual file. Returns 'processed', 'skipped', or 'error'"""
-        extension = os.path.splitext(file_path)[1].lower()
-        
-        # Skip if file should be ignored
-        if extension in self.ignore_extensions:
-            self.logger.debug(f"Skipped {file_path}: ignored extension {extension}")
-            return "skipped"
+    def _extract_all(self, pending: List[Tuple[str, str, str]]) -> Tuple[int, int]:
+        """Extract text for (file_path, category, extension) tuples. Returns (processed, errored) counts."""
+        results = queue.Queue(maxsize=RESULT_QUEUE_SIZE)
+        counts = {"processed": 0, "error": 0}
+        consumer = threading.Thread(target=self._consume_results, args=(results, counts))
+        consumer.start()
+
+        max_workers = min(os.cpu_count() or 1, MAX_WORKERS)
+        max_in_flight = max_workers * 2
+        executor = self._create_executor(max_workers)
+        try:
+            # Futures in submission order, so entries are stored in walk order
+            in_flight = deque()
+            for file_path, category, extension in pending:
+                # Wait for a free slot so finished results can't pile up faster than they are stored
+                while len(in_flight) >= max_in_flight:
+                    self._queue_result(*in_flight.popleft(), results)
+                try:
+                    future = executor.submit(extract_one, file_path, extension)
+                except BrokenProcessPool:
+                    # A worker died and took the pool with it; carry on with a fresh one
+                    self.logger.warning("Extraction worker pool broke, starting a new one")
+                    executor.shutdown(wait=False)
+                    executor = self._create_executor(max_workers)
+                    future = executor.submit(extract_one, file_path, extension)
+                in_flight.append((future, file_path, category))
+
+            while in_flight:
+                self._queue_result(*in_flight.popleft(), results)
+        finally:
+            executor.shutdown()
+            results.put(None)
+            consumer.join()
+
+        return counts["processed"], counts["error"]
+
+    def _create_executor(self, max_workers: int) -> ProcessPoolExecutor:
+        """Create the process pool used for text extraction."""
+        return ProcessPoolExecutor(max_workers=max_workers,
+                                   mp_context=multiprocessing.get_context('spawn'))
+
+    def _queue_result(self, future: Future, file_path: str, category: str, results: queue.Queue):
+        """Wait for an extraction future and put its result on the results queue."""
+        try:
+            _, text = future.result()
+        except Exception as e:
+            self.logger.error(f"Error extracting text from {file_path}: {str(e)}")
+            text = None
+        results.put((file_path, text, category))
+
+    def _consume_results(self, results: queue.Queue, counts: dict):
+        """Store extracted documents from the queue until a None sentinel arrives."""
+        while True:
+            item = results.get()
+            if item is None:
+                break
+            file_path, text, category = item
+            if text is None:
+                # Extraction itself failed, already logged by the producer
+                counts["error"] += 1
+                continue
+            counts[self._record_result(file_path, category, text)] += 1
+
+    def _walk(self, root: str) -> Iterator[Tuple[str, List[os.DirEntry]]]:
+        """Walk a directory tree top-down, yielding each directory with its file entries."""
+        try:
+            with os.scandir(root) as it:
+                entries = list(it)
+        except OSError as e:
+            self.logger.error(f"Error reading directory {root}: {str(e)}")
+            return
+
+        files = []
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                files.append(entry)
+            elif not entry.is_symlink():
+                subdirs.append(entry.path)
+
+        yield root, files
+        for subdir in subdirs:
+            yield from self._walk(subdir)
+
+    def _select_file(self, entry: os.DirEntry, subdir: str, category: Optional[str]) -> bool:
+        """Check whether a file in a directory of the given category should be processed."""
+        file_path = entry.path
         
-        # Skip if file type is not supported
-        if extension not in self.document_extensions:
-            self.logger.debug(f"Skipped {file_path}: unsupported extension {extension}")
-            return "skipped"
+        # Skip if the folder doesn't belong to any category
+        if not category:
+            self.logger.debug(f"Skipped {file_path}: no matching category for {subdir}")
+            return False
         
         # Skip if file hasn't been modified
-        if not self.file_tracker.needs_update(file_path):
+        try:
+            mtime = entry.stat().st_mtime
+        except FileNotFoundError:
+            self.logger.debug(f"Skipped {file_path}: file no longer exists")
+            return False
+        if not self.file_tracker.needs_update(file_path, mtime):
             self.logger.debug(f"Skipped {file_path}: already processed")
-            return "skipped"
+            return False
 
-        # Determine category based on folder
-        category = self._determine_category(subdir)
-        if not category:
-            self.logger.debug(f"Skipped {file_path}: no matching category for {subdir}")
-            return "skipped"
+        self.logger.info(f"Processing file: {file_path}")
+        return True
 
+    def _record_result(self, file_path: str, category: str, text: str) -> str:
+        """Store extracted text for a file. Returns 'processed' or 'error'"""
         try:
-            # Extract text from document
-            self.logger.info(f"Processing file: {file_path}")
-            text = self.doc_processor.extract_text(file_path)
-            
             if not text.strip():
                 self.logger.warning(f"No text extracted from {file_path}")
                 return "error"
@@ -117,29 +266,16 @@ class DocumentProcessingPipeline:
             self.logger.error(f"Error processing {file_path}: {str(e)}")
             return "error"
 
-    def _determine_category(self, subdir: str) -> str:
+    def _determine_category(self, subdir: str) -> Optional[str]:
         """Determine the category based on the subdirectory."""
         subdir = subdir.replace('\\', '/').lower()  # Normalize path separators and case
         
-        # Get folder names from config and convert to lower case
-        external = self.config['folders']['external'].lower()
-        internal = self.config['folders']['internal'].lower()
-        client = self.config['folders']['client'].lower()
-        
-        # Log the path and what we're looking for
         self.logger.debug(f"Checking category for path: {subdir}")
-        self.logger.debug(f"Looking for folders: {external}, {internal}, {client}")
         
-        # Check each category
-        if external in subdir:
-            self.logger.info(f"Categorized as external: {subdir}")
-            return 'external'
-        elif internal in subdir:
-            self.logger.info(f"Categorized as internal: {subdir}")
-            return 'internal'
-        elif client in subdir:
-            self.logger.info(f"Categorized as client: {subdir}")
-            return 'client'
+        match = self._category_pattern.search(subdir)
+        if match:
+            self.logger.info(f"Categorized as {match.lastgroup}: {subdir}")
+            return match.lastgroup
             
         self.logger.debug(f"No category match found for: {subdir}")
         return None
@@ -1,10 +1,14 @@
-import xml.etree.ElementTree as ET
+import lxml.etree as ET
 from typing import Optional
 import os
+import re
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Characters that are not allowed in XML 1.0 documents
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
 class XMLHandler:
     def __init__(self, output_dir: str, config: dict):
         self.output_dir = output_dir
@@ -23,6 +27,30 @@ class XMLHandler:
             'client': ET.Element('Root')
         }
         
+        # Filenames already present in each category, for duplicate checks
+        self.filenames = {
+            'external': set(),
+            'internal': set(),
+            'client': set()
+        }
+        
+        # Number of entries in each category, so saves don't have to count them
+        self.entry_counts = {
+            'external': 0,
+            'internal': 0,
+            'client': 0
+        }
+        
+        # Categories whose existing file has only been scanned, not parsed into self.roots
+        self.unloaded = set()
+        
+        # Entries added since the last save, appended to existing files on save
+        self.new_entries = {
+            'external': [],
+            'internal': [],
+            'client': []
+        }
+        
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
         logger.info(f"Output directory: {output_dir}")
@@ -38,19 +66,41 @@ class XMLHandler:
             
             if os.path.exists(file_path):
                 try:
-                    tree = ET.parse(file_path)
-                    self.roots[category] = tree.getroot()
-                    logger.info(f"Loaded existing {filename} with {len(self.roots[category])} entries")
+                    self.entry_counts[category] = self._scan_filenames(category, file_path)
+                    self.unloaded.add(category)
+                    logger.info(f"Loaded existing {filename} with {self.entry_counts[category]} entries")
                 except ET.ParseError:
+                    self.filenames[category].clear()
                     logger.warning(f"Could not parse existing {filename}, starting fresh")
             else:
                 logger.info(f"No existing file found for {category}, will create new {filename}")
 
+    def _scan_filenames(self, category: str, file_path: str) -> int:
+        """Stream an existing XML file, collecting entry filenames without building the tree."""
+        entry_count = 0
+        for _, elem in ET.iterparse(file_path, events=('end',), tag='entry', huge_tree=True):
+            filename = elem.get('filename')
+            if filename is not None:
+                self.filenames[category].add(filename)
+            entry_count += 1
+            # Free the entry and any siblings already processed
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+        return entry_count
+
+    def _load_root(self, category: str):
+        """Parse the existing file for a category into self.roots."""
+        filename = self.category_files[category]
+        # Drop whitespace-only text so pretty printing re-indents cleanly
+        parser = ET.XMLParser(remove_blank_text=True, strip_cdata=False, huge_tree=True)
+        tree = ET.parse(os.path.join(self.output_dir, filename), parser)
+        self.roots[category] = tree.getroot()
+        self.unloaded.discard(category)
+
     def _entry_exists(self, category: str, filename: str) -> bool:
         """Check if an entry with the given filename already exists."""
-        root = self.roots[category]
-        existing_entries = root.findall(".//entry[@filename]")
-        return any(entry.get('filename') == filename for entry in existing_entries)
+        return filename in self.filenames[category]
 
     def add_entry(self, category: str, filename: str, text: str, metadata: Optional[dict] = None):
         """Add a new entry to the specified XML category."""
@@ -72,45 +122,94 @@ class XMLHandler:
             for key, value in metadata.items():
                 entry.set(key, str(value))
         
-        entry.text = text
-        self.roots[category].append(entry)
+        text = _INVALID_XML_CHARS.sub('', text)
+        # CDATA is written without escaping, but can't contain its own terminator, and a
+        # raw \r inside it would be read back as \n; escaped text keeps it as &#13;
+        entry.text = ET.CDATA(text) if ']]>' not in text and '\r' not in text else text
+        self.new_entries[category].append(entry)
+        if category not in self.unloaded:
+            self.roots[category].append(entry)
+        self.filenames[category].add(filename)
+        self.entry_counts[category] += 1
         logger.info(f"Added new entry for {filename} to {category}")
 
-    def save_all(self):
-        """Save all XML files."""
+    def save_all(self) -> bool:
+        """Save all XML files. Returns False if any file could not be saved."""
         logger.info("Saving all XML files...")
-        for category, root in self.roots.items():
+        saved = True
+        for category in self.roots:
             filename = self.category_files[category]
-            self._save_xml(category, root, filename)
+            new_entries = self.new_entries[category]
+            if category in self.unloaded:
+                if not new_entries:
+                    logger.info(f"No new entries for {filename}, leaving it unchanged")
+                    continue
+                try:
+                    if self._append_entries(filename, new_entries):
+                        self.new_entries[category] = []
+                        continue
+                    # No closing tag to append before (e.g. an empty <Root/>), rebuild the file in full
+                    self._load_root(category)
+                except Exception as e:
+                    # Leave the existing file alone and keep the entries for the next save
+                    logger.error(f"Error saving {filename}: {str(e)}")
+                    saved = False
+                    continue
+                self.roots[category].extend(new_entries)
+            if self._save_xml(category, self.roots[category], filename):
+                self.new_entries[category] = []
+            else:
+                saved = False
+        return saved
+
+    def _append_entries(self, filename: str, entries: list) -> bool:
+        """Append entries to an existing XML file in place.
 
-    def _save_xml(self, category: str, root: ET.Element, filename: str):
-        """Save individual XML file."""
+        Returns False, without touching the file, if it has no closing tag to append before.
+        Raises on errors; the file is restored to its original contents first.
+        """
+        output_path = os.path.join(self.output_dir, filename)
+        closing_tag = b'</Root>'
+        # Serialize everything up front so a failure here can't leave the file half written
+        data = b''.join(
+            b'  ' + ET.tostring(entry, pretty_print=True, encoding='utf-8', xml_declaration=False)
+            for entry in entries
+        ) + closing_tag + b'\n'
+
+        with open(output_path, 'r+b') as f:
+            # The closing tag is at the end of the file, so only the tail needs reading
+            size = f.seek(0, os.SEEK_END)
+            tail_start = max(0, size - 4096)
+            f.seek(tail_start)
+            tail = f.read()
+            position = tail.rfind(closing_tag)
+            if position < 0:
+                return False
+
+            try:
+                f.seek(tail_start + position)
+                f.write(data)
+                f.truncate()
+                f.flush()
+            except Exception:
+                f.seek(tail_start)
+                f.write(tail)
+                f.truncate(size)
+                raise
+        logger.info(f"Successfully appended {len(entries)} entries to {output_path}")
+        return True
+
+    def _save_xml(self, category: str, root: ET._Element, filename: str) -> bool:
+        """Save individual XML file. Returns True on success."""
         output_path = os.path.join(self.output_dir, filename)
-        
-        # Add indentation for better readability
-        self._indent(root)
         
         # Create ElementTree and save
         tree = ET.ElementTree(root)
         try:
-            tree.write(output_path, encoding='utf-8', xml_declaration=True)
-            entry_count = len(root.findall('.//entry'))
+            tree.write(output_path, pretty_print=True, xml_declaration=True, encoding='utf-8')
+            entry_count = self.entry_counts[category]
             logger.info(f"Successfully saved {filename} with {entry_count} entries to {output_path}")
+            return True
         except Exception as e:
             logger.error(f"Error saving {filename}: {str(e)}")
-
-    def _indent(self, elem, level=0):
-        """Add proper indentation to the XML file."""
-        i = "\n" + level * "  "
-        if len(elem):
-            if not elem.text or not elem.text.strip():
-                elem.text = i + "  "
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-            for subelem in elem:
-                self._indent(subelem, level + 1)
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-        else:
-            if level and (not elem.tail or not elem.tail.strip()):
-                elem.tail = i 
\ No newline at end of file
+            return False